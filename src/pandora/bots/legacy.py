@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
 import re
+import sys
+import threading
 import uuid
+from concurrent.futures import Future, wait
 
 import pyperclip
 from rich.prompt import Prompt, Confirm
@@ -9,6 +12,25 @@ from rich.prompt import Prompt, Confirm
 from .. import __version__
 from ..openai.utils import Console
 
+_CODE_BLOCK_RE = re.compile(r'```.*\s([\s\S]*?)\s```')
+
+_USAGE_TEXT = '''/?\t\tShow this help message.
+/title\t\tSet the current conversation's title.
+/select\t\tChoice a different conversation.
+/reload\t\tReload the current conversation.
+/regen\t\tRegenerate response.
+/continue\t\tContinue generating.
+/edit\t\tEdit one of your previous prompt.
+/new\t\tStart a new conversation.
+/del\t\tDelete the current conversation.
+/token\t\tPrint your access token.
+/copy\t\tCopy the last response to clipboard.
+/copy_code\t\tCopy code from last response.
+/clear\t\tClear your screen.
+/version\tPrint the version of Pandora.
+/exit\t\tExit Pandora.
+'''
+
 
 class ChatPrompt:
     def __init__(self, prompt: str = None, parent_id=None, message_id=None):
@@ -38,6 +60,8 @@ class ChatBot:
         self.chatgpt = chatgpt
         self.token_key = None
         self.state = None
+        self.__token_keys_cache = None
+        self.__models_cache = {}
 
     def run(self):
         self.token_key = self.__choice_token_key()
@@ -80,73 +104,55 @@ class ChatBot:
 
         return '\n'.join(lines)
 
+    __COMMANDS = {alias: handler for aliases, handler in (
+        (('/quit', '/exit', '/bye'), lambda self: self.__quit()),
+        (('/del', '/delete', '/remove'), lambda self: self.__del_conversation(self.state)),
+        (('/title', '/set_title', '/set-title'), lambda self: self.__set_conversation_title(self.state)),
+        (('/select',), lambda self: self.run()),
+        (('/refresh', '/reload'), lambda self: self.__load_conversation(self.state.conversation_id)),
+        (('/new',), lambda self: self.__restart()),
+        (('/regen', '/regenerate'), lambda self: self.__regenerate_reply(self.state)),
+        (('/goon', '/continue'), lambda self: self.__continue(self.state)),
+        (('/edit', '/modify'), lambda self: self.__edit_choice()),
+        (('/token',), lambda self: self.__print_access_token()),
+        (('/cls', '/clear'), lambda self: self.__clear_screen()),
+        (('/copy', '/cp'), lambda self: self.__copy_text()),
+        (('/copy_code', '/cp_code'), lambda self: self.__copy_code()),
+        (('/ver', '/version'), lambda self: self.__print_version()),
+    ) for alias in aliases}
+
     def __process_command(self, command):
-        command = command.strip().lower()
-
-        if '/quit' == command or '/exit' == command or '/bye' == command:
-            raise KeyboardInterrupt
-        elif '/del' == command or '/delete' == command or '/remove' == command:
-            self.__del_conversation(self.state)
-        elif '/title' == command or '/set_title' == command or '/set-title' == command:
-            self.__set_conversation_title(self.state)
-        elif '/select' == command:
-            self.run()
-        elif '/refresh' == command or '/reload' == command:
-            self.__load_conversation(self.state.conversation_id)
-        elif '/new' == command:
-            self.__new_conversation()
-            self.__talk_loop()
-        elif '/regen' == command or '/regenerate' == command:
-            self.__regenerate_reply(self.state)
-        elif '/goon' == command or '/continue' == command:
-            self.__continue(self.state)
-        elif '/edit' == command or '/modify' == command:
-            self.__edit_choice()
-        elif '/token' == command:
-            self.__print_access_token()
-        elif '/cls' == command or '/clear' == command:
-            self.__clear_screen()
-        elif '/copy' == command or '/cp' == command:
-            self.__copy_text()
-        elif '/copy_code' == command or "/cp_code" == command:
-            self.__copy_code()
-        elif '/ver' == command or '/version' == command:
-            self.__print_version()
-        else:
-            self.__print_usage()
+        handler = self.__COMMANDS.get(command.strip().lower())
+        if handler is None:
+            return self.__print_usage()
+
+        handler(self)
+
+    @staticmethod
+    def __quit():
+        raise KeyboardInterrupt
+
+    def __restart(self):
+        self.__new_conversation()
+        self.__talk_loop()
 
     @staticmethod
     def __print_usage():
         Console.info_b('\n#### Command list:')
-        print('/?\t\tShow this help message.')
-        print('/title\t\tSet the current conversation\'s title.')
-        print('/select\t\tChoice a different conversation.')
-        print('/reload\t\tReload the current conversation.')
-        print('/regen\t\tRegenerate response.')
-        print('/continue\t\tContinue generating.')
-        print('/edit\t\tEdit one of your previous prompt.')
-        print('/new\t\tStart a new conversation.')
-        print('/del\t\tDelete the current conversation.')
-        print('/token\t\tPrint your access token.')
-        print('/copy\t\tCopy the last response to clipboard.')
-        print('/copy_code\t\tCopy code from last response.')
-        print('/clear\t\tClear your screen.')
-        print('/version\tPrint the version of Pandora.')
-        print('/exit\t\tExit Pandora.')
-        print()
+        sys.stdout.write(_USAGE_TEXT)
+        sys.stdout.write('\n')
 
     def __edit_choice(self):
         if not self.state.user_prompts:
             return
 
         choices = []
-        pattern = re.compile(r'\s+')
         Console.info_b('Choice your prompt to edit:')
         for idx, item in enumerate(self.state.user_prompts):
             number = str(idx + 1)
             choices.append(number)
 
-            preview_prompt = re.sub(pattern, ' ', item.prompt)
+            preview_prompt = ' '.join(item.prompt.split())
             if len(preview_prompt) > 40:
                 preview_prompt = '{}...'.format(preview_prompt[0:40])
 
@@ -237,16 +243,19 @@ class ChatBot:
 
         nodes = []
         result = self.chatgpt.get_conversation(conversation_id, token=self.token_key)
+        mapping = result['mapping']
         current_node_id = result['current_node']
 
         while True:
-            node = result['mapping'][current_node_id]
+            node = mapping[current_node_id]
             if not node.get('parent'):
                 break
 
-            nodes.insert(0, node)
+            nodes.append(node)
             current_node_id = node['parent']
 
+        nodes.reverse()
+
         self.state.title = result['title']
         self.__print_conversation_title(self.state.title)
 
@@ -257,25 +266,27 @@ class ChatBot:
                 self.state.model_slug = message['metadata']['model_slug']
 
             role = message['author']['role'] if 'author' in message else message['role']
+            if 'user' != role and 'assistant' != role:
+                continue
+
+            content0 = message['content']['parts'][0]
 
             if 'user' == role:
                 prompt = self.state.user_prompt
-                self.state.user_prompts.append(ChatPrompt(message['content']['parts'][0], parent_id=node['parent']))
+                self.state.user_prompts.append(ChatPrompt(content0, parent_id=node['parent']))
 
                 Console.info_b('You:')
-                Console.info(message['content']['parts'][0])
+                Console.info(content0)
             elif 'assistant' == role:
                 prompt = self.state.chatgpt_prompt
 
                 if not merge:
                     Console.success_b('ChatGPT:')
-                Console.success(message['content']['parts'][0])
+                Console.success(content0)
 
                 merge = 'end_turn' in message and message['end_turn'] is None
-            else:
-                continue
 
-            prompt.prompt = message['content']['parts'][0]
+            prompt.prompt = content0
             prompt.parent_id = node['parent']
             prompt.message_id = node['id']
 
@@ -338,143 +349,203 @@ class ChatBot:
             raise Exception(status, next(generator))
 
         p = 0
-        for result in generator:
-            if result['error']:
-                raise Exception(result['error'])
+        last_result = None
+        last_parts0 = None
+        with Console.stream('success') as write:
+            for result in generator:
+                if result['error']:
+                    raise Exception(result['error'])
+
+                if not result['message']:
+                    raise Exception('miss message property.')
+
+                message = result['message']
+                author_role = message['author']['role']
+                parts0 = message['content']['parts'][0]
+                if 'system' == author_role:
+                    self.state.user_prompt.parent_id = message['id']
+                elif 'assistant' == author_role:
+                    text = parts0[p:]
+                    p = len(parts0)
+
+                    if text:
+                        write(text)
+
+                last_result = result
+                last_parts0 = parts0
+
+        if last_result:
+            self.state.conversation_id = last_result['conversation_id']
+            self.state.chatgpt_prompt.prompt = last_parts0
+            self.state.chatgpt_prompt.parent_id = self.state.user_prompt.message_id
+            self.state.chatgpt_prompt.message_id = last_result['message']['id']
 
-            if not result['message']:
-                raise Exception('miss message property.')
+        print('\n')
 
-            text = None
-            message = result['message']
-            if 'assistant' == message['author']['role']:
-                text = message['content']['parts'][0][p:]
-                p += len(text)
+    def __choice_conversation(self, page=1, page_size=20):
+        prefetch = None
+        while True:
+            conversations = None
+            if prefetch and prefetch[0] == page:
+                try:
+                    conversations = prefetch[1].result()
+                except Exception:
+                    pass
+            prefetch = self.__drop_prefetch(prefetch)
+
+            if conversations is None:
+                conversations = self.chatgpt.list_conversations((page - 1) * page_size, page_size,
+                                                                token=self.token_key)
+
+            if not conversations['total']:
+                return None
 
-            self.state.conversation_id = result['conversation_id']
-            self.state.chatgpt_prompt.prompt = message['content']['parts'][0]
-            self.state.chatgpt_prompt.parent_id = self.state.user_prompt.message_id
-            self.state.chatgpt_prompt.message_id = message['id']
+            choices = ['c', 'r', 'dd']
+            items = conversations['items']
+            first_page = 0 == conversations['offset']
+            last_page = (conversations['offset'] + conversations['limit']) >= conversations['total']
 
-            if 'system' == message['author']['role']:
-                self.state.user_prompt.parent_id = message['id']
+            Console.info_b('Choice conversation (Page {}):'.format(page))
+            for idx, item in enumerate(items):
+                number = str(idx + 1)
+                choices.append(number)
+                choices.append('t' + number)
+                choices.append('d' + number)
+                Console.info('  {}.\t{}'.format(number, item['title'].replace('\n', ' ')))
 
-            if text:
-                Console.success(text, end='')
+            if not last_page:
+                choices.append('n')
+                Console.warn('  n.\t>> Next page')
 
-        print('\n')
+                prefetch = (page + 1, self.__prefetch(self.chatgpt.list_conversations, page * page_size, page_size,
+                                                      token=self.token_key))
 
-    def __choice_conversation(self, page=1, page_size=20):
-        conversations = self.chatgpt.list_conversations((page - 1) * page_size, page_size, token=self.token_key)
-        if not conversations['total']:
-            return None
+            if not first_page:
+                choices.append('p')
+                Console.warn('  p.\t<< Previous page')
 
-        choices = ['c', 'r', 'dd']
-        items = conversations['items']
-        first_page = 0 == conversations['offset']
-        last_page = (conversations['offset'] + conversations['limit']) >= conversations['total']
+            Console.warn('  t?.\tSet title for the conversation, eg: t1')
+            Console.warn('  d?.\tDelete the conversation, eg: d1')
+            Console.warn('  dd.\t!! Clear all conversations')
+            Console.warn('  r.\tRefresh conversation list')
 
-        Console.info_b('Choice conversation (Page {}):'.format(page))
-        for idx, item in enumerate(items):
-            number = str(idx + 1)
-            choices.append(number)
-            choices.append('t' + number)
-            choices.append('d' + number)
-            Console.info('  {}.\t{}'.format(number, item['title'].replace('\n', ' ')))
+            if len(self.__token_keys()) > 1:
+                choices.append('k')
+                Console.warn('  k.\tChoice access token')
 
-        if not last_page:
-            choices.append('n')
-            Console.warn('  n.\t>> Next page')
+            Console.warn('  c.\t** Start new chat')
 
-        if not first_page:
-            choices.append('p')
-            Console.warn('  p.\t<< Previous page')
+            while True:
+                choice = Prompt.ask('Your choice', choices=choices, show_choices=False)
+                if 'n' != choice:
+                    prefetch = self.__drop_prefetch(prefetch)
 
-        Console.warn('  t?.\tSet title for the conversation, eg: t1')
-        Console.warn('  d?.\tDelete the conversation, eg: d1')
-        Console.warn('  dd.\t!! Clear all conversations')
-        Console.warn('  r.\tRefresh conversation list')
+                if 'c' == choice:
+                    return None
 
-        if len(self.chatgpt.list_token_keys()) > 1:
-            choices.append('k')
-            Console.warn('  k.\tChoice access token')
+                if 'k' == choice:
+                    self.run()
+                    return
 
-        Console.warn('  c.\t** Start new chat')
+                if 'r' == choice:
+                    break
 
-        while True:
-            choice = Prompt.ask('Your choice', choices=choices, show_choices=False)
-            if 'c' == choice:
-                return None
+                if 'n' == choice:
+                    page += 1
+                    break
 
-            if 'k' == choice:
-                self.run()
-                return
+                if 'p' == choice:
+                    page -= 1
+                    break
 
-            if 'r' == choice:
-                return self.__choice_conversation(page, page_size)
+                if 'dd' == choice:
+                    self.__clear_conversations()
+                    continue
 
-            if 'n' == choice:
-                return self.__choice_conversation(page + 1, page_size)
+                if 't' == choice[0]:
+                    self.__set_conversation_title(State(conversation_id=items[int(choice[1:]) - 1]['id']))
+                    break
 
-            if 'p' == choice:
-                return self.__choice_conversation(page - 1, page_size)
+                if 'd' == choice[0]:
+                    self.__del_conversation(State(conversation_id=items[int(choice[1:]) - 1]['id']))
+                    continue
 
-            if 'dd' == choice:
-                self.__clear_conversations()
-                continue
+                return items[int(choice) - 1]
+
+    @staticmethod
+    def __prefetch(func, *args, **kwargs):
+        future = Future()
 
-            if 't' == choice[0]:
-                self.__set_conversation_title(State(conversation_id=items[int(choice[1:]) - 1]['id']))
-                return self.__choice_conversation(page, page_size)
+        def __run():
+            if not future.set_running_or_notify_cancel():
+                return
 
-            if 'd' == choice[0]:
-                self.__del_conversation(State(conversation_id=items[int(choice[1:]) - 1]['id']))
-                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
 
-            return items[int(choice) - 1]
+        threading.Thread(target=__run, daemon=True).start()
+        return future
+
+    @staticmethod
+    def __drop_prefetch(prefetch):
+        if prefetch and not prefetch[1].cancel():
+            wait([prefetch[1]])
+
+        return None
 
     def __choice_token_key(self):
-        tokens = self.chatgpt.list_token_keys()
+        tokens = self.__token_keys()
 
         size = len(tokens)
         if 1 == size:
             return None
 
-        choices = ['r']
+        choices = [str(idx + 1) for idx in range(size)]
         Console.info_b('Choice access token:')
-        for idx, item in enumerate(tokens):
-            number = str(idx + 1)
-            choices.append(number)
+        for number, item in zip(choices, tokens):
             Console.info('  {}.\t{}'.format(number, item))
 
-        while True:
-            choice = Prompt.ask('Your choice', choices=choices, show_choices=False)
+        choice = Prompt.ask('Your choice', choices=choices, show_choices=False)
 
-            return tokens[int(choice) - 1]
+        return tokens[int(choice) - 1]
 
     def __choice_model(self):
-        models = self.chatgpt.list_models(token=self.token_key)
+        while True:
+            models = self.__models()
 
-        size = len(models)
-        if 1 == size:
-            return models[0]
+            size = len(models)
+            if 1 == size:
+                return models[0]
 
-        choices = ['r']
-        Console.info_b('Choice model:')
-        for idx, item in enumerate(models):
-            number = str(idx + 1)
-            choices.append(number)
-            Console.info('  {}.\t{} - {}'.format(number, item['title'], item['description']))
+            choices = [str(idx + 1) for idx in range(size)]
+            Console.info_b('Choice model:')
+            for number, item in zip(choices, models):
+                Console.info('  {}.\t{} - {}'.format(number, item['title'], item['description']))
 
-        Console.warn('  r.\tRefresh model list')
+            choices.append('r')
+            Console.warn('  r.\tRefresh model list')
 
-        while True:
             choice = Prompt.ask('Your choice', choices=choices, show_choices=False)
             if 'r' == choice:
-                return self.__choice_model()
+                self.__models_cache.pop(self.token_key, None)
+                continue
 
             return models[int(choice) - 1]
 
+    def __token_keys(self):
+        if self.__token_keys_cache is None:
+            self.__token_keys_cache = self.chatgpt.list_token_keys()
+
+        return self.__token_keys_cache
+
+    def __models(self):
+        if self.token_key not in self.__models_cache:
+            self.__models_cache[self.token_key] = self.chatgpt.list_models(token=self.token_key)
+
+        return self.__models_cache[self.token_key]
+
     def __copy_text(self):
         pyperclip.copy(self.state.chatgpt_prompt.prompt)
         Console.info("已将上一次返回结果复制到剪切板。")
@@ -482,8 +553,7 @@ class ChatBot:
 
     def __copy_code(self):
         text = self.state.chatgpt_prompt.prompt
-        pattern = re.compile(r'```.*\s([\s\S]*?)\s```')
-        result = re.findall(pattern, text)
+        result = _CODE_BLOCK_RE.findall(text)
         if len(result) == 0:
             Console.info("未找到代码。")
             return
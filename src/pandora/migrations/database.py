@@ -1,12 +1,22 @@
 # -*- coding: utf-8 -*-
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from ..exts.config import DATABASE_URI
 
 engine = create_engine(DATABASE_URI, echo=False)
 
+if 'sqlite' == engine.dialect.name:
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragma(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA mmap_size=268435456')
+        cursor.close()
+
 Session = sessionmaker(bind=engine)
 
 session = Session()
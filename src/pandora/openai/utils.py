@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+from contextlib import contextmanager
 
 from rich.console import Console as RichConsole
 from rich.theme import Theme
@@ -30,6 +31,29 @@ class Console:
     def print(msg):
         Console.__console.print(msg)
 
+    @staticmethod
+    @contextmanager
+    def stream(style: str):
+        console = Console.__console
+        if console.legacy_windows or not console.color_system:
+            yield lambda text: console.print(text, style=style, highlight=False, end='', markup=False)
+            return
+
+        with console.capture() as capture:
+            console.print('\0', style=style, highlight=False, end='', markup=False)
+        start, _, end = capture.get().partition('\0')
+
+        def __write(text):
+            console.file.write(text)
+            console.file.flush()
+
+        console.file.write(start)
+        try:
+            yield __write
+        finally:
+            console.file.write(end)
+            console.file.flush()
+
     @staticmethod
     def info(text: str, highlight=False, bold=False, end='\n'):
         Console.__console.print(text, style='info_b' if bold else 'info', highlight=highlight, end=end, markup=False)